@@ -226,6 +226,14 @@ def get_parser():
         help="The dataset to decode",
     )
 
+    parser.add_argument(
+        "--gzip-threads",
+        type=int,
+        default=1,
+        help="""Number of threads used to decompress each .jsonl.gz manifest.
+        Values larger than 1 require 'pip install rapidgzip'.""",
+    )
+
     add_model_arguments(parser)
     return parser
 
@@ -603,7 +611,7 @@ def main():
     args.return_cuts = True
 
     data_module = AsrDataModule(args)
-    multi_dataset = MultiDataset(args.manifest_dir)
+    multi_dataset = MultiDataset(args.manifest_dir, gzip_threads=args.gzip_threads)
 
     def remove_long_utt(c: Cut):
         # Keep only utterances with duration in 30 seconds
@@ -16,17 +16,289 @@
 
 
 import glob
+import gzip
+import io
+import json
 import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import lhotse
-from lhotse import CutSet, load_manifest_lazy
+from lhotse import (
+    CutSet,
+    LilcomChunkyWriter,
+    MonoCut,
+    SupervisionSegment,
+    load_manifest_lazy,
+)
+from lhotse.lazy import count_newlines_fast
+from lhotse.serialization import (
+    CompositeIOBackend,
+    GzipIOBackend,
+    IOBackend,
+    decode_json_line,
+    get_current_io_backend,
+    open_best,
+    set_current_io_backend,
+)
+from lhotse.utils import Pathlike, is_module_available, is_valid_url
+from torch import distributed as dist
+
+
+class RapidgzipIOBackend(IOBackend):
+    """Reads local ``.gz`` files with the multi-threaded decoder of rapidgzip.
+
+    Lhotse decompresses ``.jsonl.gz`` manifests with a single thread, which
+    takes tens of seconds for large manifests like WeNetSpeech L.
+    Writing is delegated to :class:`lhotse.serialization.GzipIOBackend`.
+    """
+
+    def __init__(self, num_threads: int = 8):
+        self.num_threads = num_threads
+
+    def open(self, identifier, mode: str):
+        if "r" not in mode:
+            return GzipIOBackend().open(identifier, mode)
+
+        import rapidgzip
+
+        f = io.BufferedReader(
+            rapidgzip.open(str(identifier), parallelization=self.num_threads)
+        )
+        if "b" in mode:
+            return f
+        return io.TextIOWrapper(f, encoding="utf-8")
+
+    def handles_special_case(self, identifier) -> bool:
+        return GzipIOBackend().handles_special_case(identifier)
+
+    def is_applicable(self, identifier) -> bool:
+        return self.handles_special_case(identifier)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return is_module_available("rapidgzip")
+
+
+class ZstdIOBackend(IOBackend):
+    """Reads and writes local ``.zst`` files with zstandard.
+
+    Zstandard decompresses several times faster than gzip. Use
+    :meth:`MultiDataset.convert_manifests_to_zst` to create ``.jsonl.zst``
+    copies of the ``.jsonl.gz`` manifests.
+    """
+
+    def open(self, identifier, mode: str):
+        import zstandard
+
+        if "t" not in mode and "b" not in mode:
+            # Same as lhotse's GzipIOBackend: default to text mode.
+            mode = mode + "t"
+        cctx = None
+        if "r" not in mode:
+            cctx = zstandard.ZstdCompressor(level=3, threads=-1)
+        return zstandard.open(str(identifier), mode, cctx=cctx, encoding="utf-8")
+
+    def handles_special_case(self, identifier) -> bool:
+        identifier = str(identifier)
+        return identifier.endswith(".zst") and not is_valid_url(identifier)
+
+    def is_applicable(self, identifier) -> bool:
+        return self.handles_special_case(identifier)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return is_module_available("zstandard")
+
+
+def _has_io_backend(current: IOBackend, backend_type: type) -> bool:
+    """Return True if ``current`` is, or contains at any depth of nested
+    :class:`CompositeIOBackend`, a backend of type ``backend_type``.
+    """
+    if type(current) is backend_type:
+        return True
+    if isinstance(current, CompositeIOBackend):
+        return any(_has_io_backend(b, backend_type) for b in current.backends)
+    return False
+
+
+def _register_io_backend(backend: IOBackend) -> None:
+    """Let lhotse try ``backend`` before its current IO backend.
+
+    It is a no-op if a backend of the same type has already been registered.
+    """
+    current = get_current_io_backend()
+    if _has_io_backend(current, type(backend)):
+        return
+
+    set_current_io_backend(CompositeIOBackend([backend, current]))
+
+
+def _file_key(path: Pathlike) -> str:
+    """Return a key that changes whenever the file ``path`` is rewritten."""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+@lru_cache(maxsize=64)
+def _load(path: str) -> CutSet:
+    """Open the lazy manifest at ``path``.
+
+    Calls are cached for the lifetime of the process, so methods of
+    :class:`MultiDataset` sharing a manifest (e.g. ``train_cuts`` and
+    ``aishell_train_cuts``) reuse the same CutSet instead of reopening it.
+
+    Args:
+      path:
+        Absolute path to the manifest. Use ``str(p.resolve())`` so that the
+        same file always maps to the same cache entry.
+    """
+    return load_manifest_lazy(path)
+
+
+class _MetadataJsonlIterator:
+    """Iterates over a cut manifest of MonoCuts, keeping only the timing of
+    each cut and of its first supervision, and the text of the latter.
+
+    Every line is still decoded as JSON. What is saved is building the
+    recording, features and alignment objects of each cut, which
+    :func:`load_manifest_lazy` does for every line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self):
+        with open_best(self.path, "r") as f:
+            for line in f:
+                data = decode_json_line(line)
+                cut_type = data.get("type", "MonoCut")
+                assert cut_type == "MonoCut", (
+                    f"Only MonoCut is supported with only_metadata=True, "
+                    f"but cut {data['id']} in {self.path} is a {cut_type}"
+                )
+                supervisions = []
+                if data.get("supervisions"):
+                    s = data["supervisions"][0]
+                    supervisions.append(
+                        SupervisionSegment(
+                            id=s["id"],
+                            recording_id=s["recording_id"],
+                            start=s["start"],
+                            duration=s["duration"],
+                            channel=s.get("channel", 0),
+                            text=s.get("text"),
+                        )
+                    )
+                yield MonoCut(
+                    id=data["id"],
+                    start=data["start"],
+                    duration=data["duration"],
+                    channel=data["channel"],
+                    supervisions=supervisions,
+                )
+
+    def __len__(self) -> int:
+        return count_newlines_fast(self.path)
+
+
+@lru_cache(maxsize=64)
+def _load_metadata(path: str) -> CutSet:
+    """Like :func:`_load`, but returns cuts with metadata only.
+    See :class:`_MetadataJsonlIterator`.
+    """
+    return CutSet(_MetadataJsonlIterator(path))
 
 
 class MultiDataset:
-    def __init__(self, fbank_dir: str):
+    # Manifests relative to fbank_dir, indexed by the name of their cut set.
+    _MANIFESTS: Dict[str, str] = {
+        # Training sets
+        "thchs-30_train": "thchs_30_cuts_train.jsonl.gz",
+        "aishell_train": "aishell_cuts_train.jsonl.gz",
+        "aishell-2_train": "aishell2_cuts_train.jsonl.gz",
+        "aishell-4_train_L": "aishell4_cuts_train_L.jsonl.gz",
+        "aishell-4_train_M": "aishell4_cuts_train_M.jsonl.gz",
+        "aishell-4_train_S": "aishell4_cuts_train_S.jsonl.gz",
+        "ali-meeting_train": "alimeeting-far_cuts_train.jsonl.gz",
+        "stcmds_train": "stcmds_cuts_train.jsonl.gz",
+        "primewords_train": "primewords_cuts_train.jsonl.gz",
+        "magicdata_train": "magicdata_cuts_train.jsonl.gz",
+        "wenetspeech_train_L": "wenetspeech/cuts_L_fixed.jsonl.gz",
+        "kespeech-asr_train_phase1": "kespeech/kespeech-asr_cuts_train_phase1.jsonl.gz",
+        "kespeech-asr_train_phase2": "kespeech/kespeech-asr_cuts_train_phase2.jsonl.gz",
+        # Dev and test sets
+        "wenetspeech-meeting_test": "wenetspeech/cuts_TEST_MEETING.jsonl.gz",
+        "aishell_test": "aishell_cuts_test.jsonl.gz",
+        "aishell_dev": "aishell_cuts_dev.jsonl.gz",
+        "ali-meeting_test": "alimeeting-far_cuts_test.jsonl.gz",
+        "ali-meeting_eval": "alimeeting-far_cuts_eval.jsonl.gz",
+        "aishell-4_test": "aishell4_cuts_test.jsonl.gz",
+        "aishell-2_test": "aishell2_cuts_test.jsonl.gz",
+        "aishell-2_dev": "aishell2_cuts_dev.jsonl.gz",
+        "magicdata_test": "magicdata_cuts_test.jsonl.gz",
+        "magicdata_dev": "magicdata_cuts_dev.jsonl.gz",
+        "kespeech-asr_test": "kespeech/kespeech-asr_cuts_test.jsonl.gz",
+        "kespeech-asr_dev_phase1": "kespeech/kespeech-asr_cuts_dev_phase1.jsonl.gz",
+        "kespeech-asr_dev_phase2": "kespeech/kespeech-asr_cuts_dev_phase2.jsonl.gz",
+        "wenetspeech-net_test": "wenetspeech/cuts_TEST_NET.jsonl.gz",
+        "wenetspeech_dev": "wenetspeech/cuts_DEV_fixed.jsonl.gz",
+        # SpeechIO test sets
+        **{
+            f"SPEECHIO_ASR_ZH{i:05d}": f"speechio_cuts_SPEECHIO_ASR_ZH{i:05d}.jsonl.gz"
+            for i in range(27)
+        },
+    }
+
+    # Training sets mixed by train_cuts(), in the order of CutSet.mux().
+    _TRAIN_SETS: List[str] = [
+        "thchs-30_train",
+        "aishell_train",
+        "aishell-2_train",
+        "aishell-4_train_L",
+        "aishell-4_train_M",
+        "aishell-4_train_S",
+        "ali-meeting_train",
+        "stcmds_train",
+        "primewords_train",
+        "magicdata_train",
+        "wenetspeech_train_L",
+        "kespeech-asr_train_phase1",
+        "kespeech-asr_train_phase2",
+    ]
+
+    _TEST_SETS: List[str] = [
+        "wenetspeech-meeting_test",
+        "aishell_test",
+        "aishell_dev",
+        "ali-meeting_test",
+        "ali-meeting_eval",
+        "aishell-4_test",
+        "aishell-2_test",
+        "aishell-2_dev",
+        "magicdata_test",
+        "magicdata_dev",
+        "kespeech-asr_test",
+        "kespeech-asr_dev_phase1",
+        "kespeech-asr_dev_phase2",
+        "wenetspeech-net_test",
+        "wenetspeech_dev",
+    ]
+
+    _SPEECHIO_TEST_SETS: List[str] = [f"SPEECHIO_ASR_ZH{i:05d}" for i in range(27)]
+
+    def __init__(
+        self,
+        fbank_dir: str,
+        gzip_threads: int = 1,
+        codec: str = "zst",
+        only_metadata: bool = False,
+        use_shar: bool = False,
+    ):
         """
         Args:
           manifest_dir:
@@ -44,295 +316,469 @@ class MultiDataset:
             - kespeech/kespeech-asr_cuts_train_phase1.jsonl.gz
             - kespeech/kespeech-asr_cuts_train_phase2.jsonl.gz
             - wenetspeech/cuts_L_fixed.jsonl.gz
+          gzip_threads:
+            Number of threads used to decompress each manifest. It requires
+            ``pip install rapidgzip``; otherwise, or if it is 1 (the default),
+            manifests are decompressed by a single thread. Note that
+            ``train_cuts`` reads all training sets at the same time, each
+            with its own threads, in every process.
+          codec:
+            Either "zst" or "gz". If it is "zst", a ``.jsonl.zst`` copy of a
+            manifest is used instead of the ``.jsonl.gz`` one whenever it
+            exists. See :meth:`convert_manifests_to_zst`.
+          only_metadata:
+            If True, the returned cuts only contain their id, timing and
+            first supervision without its alignment. Lines are still fully
+            decoded as JSON; it only skips building the recording, features
+            and alignment objects. Use it when features and audio are not
+            needed, e.g., to inspect durations or transcripts.
+          use_shar:
+            If True, :meth:`train_cuts` reads the training sets from the
+            Lhotse Shar shards created by :meth:`export_shar`. The returned
+            cuts are split across ranks and DataLoader workers, so they must
+            be sampled inside the workers, e.g., with
+            ``lhotse.dataset.IterableDatasetWrapper``; the sampler of
+            ``AsrDataModule.train_dataloaders`` runs in the main process and
+            does not support it.
         """
+        assert codec in ("zst", "gz"), codec
+        assert not (
+            use_shar and only_metadata
+        ), "use_shar and only_metadata are mutually exclusive"
         self.fbank_dir = Path(fbank_dir)
+        self.len_cache_file = self.fbank_dir / ".cuts_len_cache.json"
+        self.mux_weights_file = self.fbank_dir / "train_mux_weights.json"
+        self.only_metadata = only_metadata
+        self.use_shar = use_shar
+        self._loader = _load_metadata if only_metadata else _load
+
+        if not is_module_available("orjson"):
+            # lhotse decodes every line of a manifest with orjson if available.
+            logging.info("orjson is not installed. Use json to parse manifests")
+
+        if gzip_threads > 1:
+            if RapidgzipIOBackend.is_available():
+                _register_io_backend(RapidgzipIOBackend(gzip_threads))
+            else:
+                logging.info("rapidgzip is not installed. Use single-threaded gzip")
+
+        if codec == "zst" and not ZstdIOBackend.is_available():
+            logging.info("zstandard is not installed. Use .jsonl.gz manifests")
+            codec = "gz"
+        if codec == "zst":
+            _register_io_backend(ZstdIOBackend())
+        self.codec = codec
+        self.merged_train_file = (
+            self.fbank_dir / f"cuts_multidataset_train.jsonl.{codec}"
+        )
+        # Size and modification time of the manifests merged into
+        # self.merged_train_file; see build_merged_train().
+        self.merged_sources_file = self.merged_train_file.with_name(
+            self.merged_train_file.name + ".sources.json"
+        )
+        self._paths = self._resolve_paths()
+
+    def _manifest_path(self, name: str) -> Path:
+        """Return the path of the manifest ``name``, which is relative to
+        ``self.fbank_dir`` and ends with ``.jsonl.gz``.
+
+        If ``self.codec`` is "zst" and there is a ``.jsonl.zst`` version of
+        the manifest that is not older than the ``.jsonl.gz`` one, the path
+        to it is returned instead.
+        """
+        path = self.fbank_dir / name
+        if self.codec == "zst":
+            zst_path = path.with_suffix(".zst")
+            if not zst_path.is_file():
+                return path
+            if path.is_file() and zst_path.stat().st_mtime < path.stat().st_mtime:
+                logging.warning(
+                    f"{zst_path} is older than {path} - ignoring it. "
+                    "Please re-run convert_manifests_to_zst()"
+                )
+                return path
+            return zst_path
+        return path
+
+    def _resolve_paths(self) -> Dict[str, str]:
+        """Return the absolute path of the manifest of each cut set in
+        ``self._MANIFESTS``, as used by :func:`_load`.
+        """
+        return {
+            key: str(self._manifest_path(name).resolve())
+            for key, name in self._MANIFESTS.items()
+        }
 
-    def train_cuts(self) -> CutSet:
-        logging.info("About to get multidataset train cuts")
-
-        # THCHS-30
-        logging.info("Loading THCHS-30 in lazy mode")
-        thchs_30_cuts = load_manifest_lazy(
-            self.fbank_dir / "thchs_30_cuts_train.jsonl.gz"
-        )
-
-        # AISHELL-1
-        logging.info("Loading Aishell-1 in lazy mode")
-        aishell_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_train.jsonl.gz"
-        )
+    def _shar_dir(self, name: str) -> Path:
+        """Return the directory with the Lhotse Shar shards of the manifest
+        ``name``. See :meth:`export_shar`.
+        """
+        return self.fbank_dir / "shar" / name[: -len(".jsonl.gz")]
 
-        # AISHELL-2
-        logging.info("Loading Aishell-2 in lazy mode")
-        aishell_2_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_train.jsonl.gz"
-        )
+    def export_shar(self, shard_size: int = 1000, num_jobs: int = 16) -> None:
+        """Export each training set together with its features to the
+        Lhotse Shar format, i.e., tar shards that are read sequentially
+        during training instead of seeking into many feature files.
 
-        # AISHELL-4
-        logging.info("Loading Aishell-4 in lazy mode")
-        aishell_4_L_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell4_cuts_train_L.jsonl.gz"
-        )
-        aishell_4_M_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell4_cuts_train_M.jsonl.gz"
-        )
-        aishell_4_S_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell4_cuts_train_S.jsonl.gz"
-        )
+        The shards of a manifest ``<name>.jsonl.gz`` are saved to
+        ``self.fbank_dir / "shar" / <name>``. Training sets that have
+        already been exported are skipped. They are only used by
+        :meth:`train_cuts` with ``use_shar=True``.
+        """
+        for key in self._TRAIN_SETS:
+            name = self._MANIFESTS[key]
+            out_dir = self._shar_dir(name)
+            if out_dir.is_dir():
+                logging.info(f"{out_dir} exists - skipping")
+                continue
+
+            logging.info(f"Exporting {name} to {out_dir}")
+            tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            cuts = _load(self._paths[key])
+            cuts.to_shar(
+                tmp_dir,
+                fields={"features": "lilcom"},
+                shard_size=shard_size,
+                num_jobs=num_jobs,
+            )
+            tmp_dir.rename(out_dir)
+
+    def _cut_manifests(self) -> List[Path]:
+        """Return the existing manifests of all cut sets in ``self._MANIFESTS``."""
+        paths = [self.fbank_dir / name for name in self._MANIFESTS.values()]
+        return [p for p in paths if p.is_file()]
+
+    def quantize_features(self, out_dir: Pathlike, tick_power: int) -> None:
+        """Copy the manifests in ``self.fbank_dir`` to ``out_dir`` and store
+        their features again with lilcom at a coarser precision, so that
+        fewer bytes are read per epoch. Afterwards, train with
+        ``--manifest-dir out_dir``.
 
-        # ST-CMDS
-        logging.info("Loading ST-CMDS in lazy mode")
-        stcmds_cuts = load_manifest_lazy(self.fbank_dir / "stcmds_cuts_train.jsonl.gz")
+        Args:
+          out_dir:
+            The output directory. Manifests keep their relative paths.
+            Existing ones are skipped.
+          tick_power:
+            Features are rounded to integer multiples of 2^tick_power, so
+            each value changes by up to 2^(tick_power - 1). The default of
+            lhotse, with which the features were most likely computed, is -5.
+            The Whisper features of this recipe are log-mels normalized as
+            (log10(mel) + 4) / 4, spanning about 2 units of 40 dB each:
+            -5 changes them by up to 0.016 (0.6 dB) and -3 by up to 0.0625
+            (2.5 dB). Check the accuracy of a model trained on the output
+            before relying on it.
+        """
+        out_dir = Path(out_dir)
+        for src in self._cut_manifests():
+            name = src.relative_to(self.fbank_dir)
+            dst = out_dir / name
+            if dst.is_file():
+                logging.info(f"{dst} exists - skipping")
+                continue
+
+            logging.info(f"Quantizing features of {src} to {dst}")
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            storage_path = dst.parent / ("feats_" + name.name[: -len(".jsonl.gz")])
+            tmp = dst.with_name("." + dst.name)
+            with LilcomChunkyWriter(
+                storage_path, tick_power=tick_power
+            ) as writer, CutSet.open_writer(tmp) as cut_writer:
+                for cut in load_manifest_lazy(src):
+                    if cut.has_features:
+                        cut.features = cut.features.copy_feats(writer)
+                    cut_writer.write(cut)
+            os.replace(tmp, dst)
+
+    def convert_manifests_to_zst(self) -> None:
+        """Write a ``.jsonl.zst`` copy of every ``*cuts*.jsonl.gz`` manifest
+        in ``self.fbank_dir``. Manifests whose copy is up to date are skipped.
+        """
+        import zstandard
+
+        cctx = zstandard.ZstdCompressor(level=3, threads=-1)
+        for src in self._cut_manifests():
+            dst = src.with_suffix(".zst")
+            if dst.is_file() and dst.stat().st_mtime >= src.stat().st_mtime:
+                continue
+
+            logging.info(f"Converting {src} to {dst}")
+            tmp = dst.with_suffix(".zst.tmp")
+            with gzip.open(src, "rb") as fin, open(tmp, "wb") as fout:
+                cctx.copy_stream(fin, fout)
+            os.replace(tmp, dst)
+
+        # Use the new .jsonl.zst manifests from now on.
+        self._paths = self._resolve_paths()
+
+    def _load_many(self, keys: List[str]) -> Dict[str, CutSet]:
+        """Open the manifests of the cut sets ``keys``, which are keys of
+        ``self._MANIFESTS``.
+
+        Manifests are opened through the process-level cache of :func:`_load`
+        (or :func:`_load_metadata` if ``self.only_metadata`` is True).
+        Opening a lazy manifest reads (and decompresses) its first line,
+        which is I/O bound, so those not in the cache are opened concurrently
+        in a thread pool.
+
+        Returns:
+          A dict mapping each key to its CutSet, in the order of ``keys``.
+        """
+        # A single message instead of one per manifest; the join is skipped
+        # entirely when INFO logging is disabled.
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info("Loading %s in lazy mode", ", ".join(keys))
+
+        paths = [self._paths[key] for key in keys]
+        max_workers = min(len(paths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(keys, executor.map(self._loader, paths)))
+
+    def _cached_len(self, path: str) -> int:
+        """Return the number of cuts in the manifest ``path``.
+
+        Counting the cuts of a lazy manifest requires decompressing the whole
+        file, which takes a long time for large datasets like WeNetSpeech L.
+        The result is therefore cached in ``self.len_cache_file``, keyed by the
+        size and modification time of the manifest, so that it is computed
+        only once per manifest.
+        """
+        key = _file_key(path)
+        name = os.path.relpath(path, self.fbank_dir.resolve())
+
+        cache = {}
+        if self.len_cache_file.is_file():
+            with open(self.len_cache_file) as f:
+                cache = json.load(f)
+
+        if name in cache and cache[name]["key"] == key:
+            return cache[name]["len"]
+
+        logging.info(f"Counting cuts in {path}")
+        num_cuts = len(_load(path))
+        cache[name] = {"key": key, "len": num_cuts}
+
+        # Write to a temporary file first so that concurrent readers
+        # never see a partially written cache.
+        tmp_file = self.len_cache_file.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp_file, self.len_cache_file)
+        except OSError as e:
+            logging.warning(f"Failed to write {self.len_cache_file}: {e}")
+
+        return num_cuts
+
+    def prepare_weights(self) -> None:
+        """Count the cuts of each training set and save the result to
+        ``self.mux_weights_file``, which is used by :meth:`train_cuts` as
+        the weights of ``CutSet.mux()``.
+
+        Run it once after the manifests are created so that training
+        does not need to scan every manifest at startup. Like
+        ``self.len_cache_file``, each count is stored together with the
+        size and modification time of its manifest, so that the file is
+        ignored once a manifest is rebuilt.
+        """
+        weights = {
+            key: {
+                "key": _file_key(self._paths[key]),
+                "len": self._cached_len(self._paths[key]),
+            }
+            for key in self._TRAIN_SETS
+        }
+        with open(self.mux_weights_file, "w") as f:
+            json.dump(weights, f, indent=2)
+        logging.info(f"Saved mux weights to {self.mux_weights_file}")
+
+    def _train_weights(self) -> List[int]:
+        """Return the number of cuts of each training set in the order of
+        ``self._TRAIN_SETS``.
+
+        They are read from ``self.mux_weights_file`` if it is up to date with
+        the manifests (see :meth:`prepare_weights`). Otherwise, they are
+        counted with :meth:`_cached_len` on rank 0 and broadcast to the
+        other ranks in distributed training.
+        """
+        paths = [self._paths[key] for key in self._TRAIN_SETS]
+        if self.mux_weights_file.is_file():
+            with open(self.mux_weights_file) as f:
+                weights = json.load(f)
+            if all(
+                isinstance(weights.get(key), dict)
+                and weights[key]["key"] == _file_key(path)
+                for key, path in zip(self._TRAIN_SETS, paths)
+            ):
+                return [weights[key]["len"] for key in self._TRAIN_SETS]
+            logging.warning(
+                f"{self.mux_weights_file} is outdated. "
+                "Please re-run prepare_weights()"
+            )
+
+        if dist.is_available() and dist.is_initialized():
+            # Only rank 0 scans the manifests, so that they are not read
+            # world_size times from a shared file system.
+            weights = [None]
+            if dist.get_rank() == 0:
+                weights = [[self._cached_len(path) for path in paths]]
+            dist.broadcast_object_list(weights, src=0)
+            return weights[0]
+
+        return [self._cached_len(path) for path in paths]
+
+    def build_merged_train(self, seed: int = 0) -> None:
+        """Interleave all training sets in proportion to their sizes and save
+        the result to ``self.merged_train_file``.
+
+        :meth:`train_cuts` then reads this single manifest instead of
+        opening every training set and mixing them with ``CutSet.mux()``
+        at runtime. The size and modification time of each training set
+        are saved to ``self.merged_sources_file``, so that the merged
+        manifest is ignored once a training manifest changes.
+        """
+        assert not self.only_metadata, "It requires only_metadata=False"
+        sources = self._train_sources()
+        cuts = self._load_many(self._TRAIN_SETS)
+        cuts = CutSet.mux(*cuts.values(), weights=self._train_weights(), seed=seed)
+
+        logging.info(f"Saving to {self.merged_train_file}")
+        tmp = self.merged_train_file.with_name("." + self.merged_train_file.name)
+        cuts.to_file(tmp)
+        os.replace(tmp, self.merged_train_file)
+        with open(self.merged_sources_file, "w") as f:
+            json.dump(sources, f, indent=2)
+
+    def _train_sources(self) -> Dict[str, Optional[str]]:
+        """Return the :func:`_file_key` of the manifest of each training set,
+        or None for those that do not exist.
+        """
+        return {
+            key: (
+                _file_key(self._paths[key])
+                if os.path.isfile(self._paths[key])
+                else None
+            )
+            for key in self._TRAIN_SETS
+        }
 
-        # Primewords
-        logging.info("Loading Primewords in lazy mode")
-        primewords_cuts = load_manifest_lazy(
-            self.fbank_dir / "primewords_cuts_train.jsonl.gz"
-        )
+    def _use_merged_train(self) -> bool:
+        """Return True if ``self.merged_train_file`` exists and was built from
+        the current training manifests. See :meth:`build_merged_train`.
+        """
+        if not self.merged_train_file.is_file():
+            return False
+
+        sources = None
+        if self.merged_sources_file.is_file():
+            with open(self.merged_sources_file) as f:
+                sources = json.load(f)
+        if sources != self._train_sources():
+            logging.warning(
+                f"{self.merged_train_file} is outdated - ignoring it. "
+                "Please re-run build_merged_train()"
+            )
+            return False
+        return True
+
+    def _shar_train_cuts(self) -> CutSet:
+        """Return the training sets exported by :meth:`export_shar`, mixed in
+        proportion to their sizes.
+
+        Shards are split across ranks and DataLoader workers, so each worker
+        reads the features of its own shards only. See ``use_shar`` in
+        :meth:`__init__`.
+        """
+        cuts = []
+        for key in self._TRAIN_SETS:
+            shar_dir = self._shar_dir(self._MANIFESTS[key])
+            assert shar_dir.is_dir(), f"{shar_dir} does not exist. Run export_shar()"
+            logging.info(f"Using Lhotse Shar from {shar_dir}")
+            cuts.append(
+                CutSet.from_shar(
+                    in_dir=shar_dir,
+                    split_for_dataloading=True,
+                    shuffle_shards=True,
+                )
+            )
+
+        return CutSet.mux(*cuts, weights=self._train_weights())
+
+    def train_cuts(self, prefetch_buffer_size: int = 0) -> CutSet:
+        """Return the training sets mixed in proportion to their sizes.
+
+        If ``use_shar`` was given to :meth:`__init__`, the Lhotse Shar
+        exports of :meth:`export_shar` are used. Otherwise, the manifest
+        created by :meth:`build_merged_train` is used if it exists and is
+        up to date with the training manifests.
 
-        # MagicData
-        logging.info("Loading MagicData in lazy mode")
-        magicdata_cuts = load_manifest_lazy(
-            self.fbank_dir / "magicdata_cuts_train.jsonl.gz"
-        )
+        Args:
+          prefetch_buffer_size:
+            If positive, cuts are read ahead in a background process into a
+            buffer of this size with ``CutSet.prefetch()``, overlapping
+            manifest decompression with training. Note that it spawns a
+            single-worker DataLoader. Disabled by default.
+        """
+        logging.info("About to get multidataset train cuts")
 
-        # Ali-Meeting
-        logging.info("Loading Ali-Meeting in lazy mode")
-        alimeeting_cuts = load_manifest_lazy(
-            self.fbank_dir / "alimeeting-far_cuts_train.jsonl.gz"
-        )
+        if self.use_shar:
+            # CutSet.prefetch() would iterate over the cuts in its own
+            # worker instead of the training DataLoader workers.
+            assert prefetch_buffer_size == 0, "prefetch is not supported with Shar"
+            return self._shar_train_cuts()
 
-        # WeNetSpeech
-        logging.info("Loading WeNetSpeech in lazy mode")
-        wenetspeech_L_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_L_fixed.jsonl.gz"
-        )
+        if self._use_merged_train():
+            logging.info(f"Loading {self.merged_train_file} in lazy mode")
+            cuts = self._loader(str(self.merged_train_file.resolve()))
+            if prefetch_buffer_size > 0:
+                cuts = cuts.prefetch(buffer_size=prefetch_buffer_size)
+            return cuts
 
-        # KeSpeech
-        logging.info("Loading KeSpeech in lazy mode")
-        kespeech_1_cuts = load_manifest_lazy(
-            self.fbank_dir / "kespeech" / "kespeech-asr_cuts_train_phase1.jsonl.gz"
-        )
-        kespeech_2_cuts = load_manifest_lazy(
-            self.fbank_dir / "kespeech" / "kespeech-asr_cuts_train_phase2.jsonl.gz"
-        )
+        cuts = self._load_many(self._TRAIN_SETS)
+        cuts = CutSet.mux(*cuts.values(), weights=self._train_weights())
+        if prefetch_buffer_size > 0:
+            cuts = cuts.prefetch(buffer_size=prefetch_buffer_size)
 
-        return CutSet.mux(
-            thchs_30_cuts,
-            aishell_cuts,
-            aishell_2_cuts,
-            aishell_4_L_cuts,
-            aishell_4_M_cuts,
-            aishell_4_S_cuts,
-            alimeeting_cuts,
-            stcmds_cuts,
-            primewords_cuts,
-            magicdata_cuts,
-            wenetspeech_L_cuts,
-            kespeech_1_cuts,
-            kespeech_2_cuts,
-            weights=[
-                len(thchs_30_cuts),
-                len(aishell_cuts),
-                len(aishell_2_cuts),
-                len(aishell_4_L_cuts),
-                len(aishell_4_M_cuts),
-                len(aishell_4_S_cuts),
-                len(alimeeting_cuts),
-                len(stcmds_cuts),
-                len(primewords_cuts),
-                len(magicdata_cuts),
-                len(wenetspeech_L_cuts),
-                len(kespeech_1_cuts),
-                len(kespeech_2_cuts),
-            ],
-        )
+        return cuts
 
     def dev_cuts(self) -> CutSet:
         logging.info("About to get multidataset dev cuts")
-
-        # WeNetSpeech
-        logging.info("Loading WeNetSpeech DEV set in lazy mode")
-        wenetspeech_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_DEV_fixed.jsonl.gz"
-        )
-
-        return wenetspeech_dev_cuts
+        return self._load_many(["wenetspeech_dev"])["wenetspeech_dev"]
 
     def test_cuts(self) -> Dict[str, CutSet]:
         logging.info("About to get multidataset test cuts")
-
-        # AISHELL
-        logging.info("Loading Aishell set in lazy mode")
-        aishell_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_test.jsonl.gz"
-        )
-        aishell_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_dev.jsonl.gz"
-        )
-
-        # AISHELL-2
-        logging.info("Loading Aishell-2 set in lazy mode")
-        aishell2_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_test.jsonl.gz"
-        )
-        aishell2_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_dev.jsonl.gz"
-        )
-
-        # AISHELL-4
-        logging.info("Loading Aishell-4 TEST set in lazy mode")
-        aishell4_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell4_cuts_test.jsonl.gz"
-        )
-
-        # Ali-Meeting
-        logging.info("Loading Ali-Meeting set in lazy mode")
-        alimeeting_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "alimeeting-far_cuts_test.jsonl.gz"
-        )
-        alimeeting_eval_cuts = load_manifest_lazy(
-            self.fbank_dir / "alimeeting-far_cuts_eval.jsonl.gz"
-        )
-
-        # MagicData
-        logging.info("Loading MagicData set in lazy mode")
-        magicdata_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "magicdata_cuts_test.jsonl.gz"
-        )
-        magicdata_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "magicdata_cuts_dev.jsonl.gz"
-        )
-
-        # KeSpeech
-        logging.info("Loading KeSpeech set in lazy mode")
-        kespeech_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "kespeech" / "kespeech-asr_cuts_test.jsonl.gz"
-        )
-        kespeech_dev_phase1_cuts = load_manifest_lazy(
-            self.fbank_dir / "kespeech" / "kespeech-asr_cuts_dev_phase1.jsonl.gz"
-        )
-        kespeech_dev_phase2_cuts = load_manifest_lazy(
-            self.fbank_dir / "kespeech" / "kespeech-asr_cuts_dev_phase2.jsonl.gz"
-        )
-
-        # WeNetSpeech
-        logging.info("Loading WeNetSpeech set in lazy mode")
-        wenetspeech_test_meeting_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_TEST_MEETING.jsonl.gz"
-        )
-        wenetspeech_test_net_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_TEST_NET.jsonl.gz"
-        )
-        wenetspeech_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_DEV_fixed.jsonl.gz"
-        )
-
-        return {
-            "wenetspeech-meeting_test": wenetspeech_test_meeting_cuts,
-            "aishell_test": aishell_test_cuts,
-            "aishell_dev": aishell_dev_cuts,
-            "ali-meeting_test": alimeeting_test_cuts,
-            "ali-meeting_eval": alimeeting_eval_cuts,
-            "aishell-4_test": aishell4_test_cuts,
-            "aishell-2_test": aishell2_test_cuts,
-            "aishell-2_dev": aishell2_dev_cuts,
-            "magicdata_test": magicdata_test_cuts,
-            "magicdata_dev": magicdata_dev_cuts,
-            "kespeech-asr_test": kespeech_test_cuts,
-            "kespeech-asr_dev_phase1": kespeech_dev_phase1_cuts,
-            "kespeech-asr_dev_phase2": kespeech_dev_phase2_cuts,
-            "wenetspeech-net_test": wenetspeech_test_net_cuts,
-            "wenetspeech_dev": wenetspeech_dev_cuts,
-        }
+        return self._load_many(self._TEST_SETS)
 
     def aishell_train_cuts(self) -> CutSet:
         logging.info("About to get multidataset train cuts")
-        logging.info("Loading Aishell-1 in lazy mode")
-        aishell_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_train.jsonl.gz"
-        )
-
-        return aishell_cuts
+        return self._load_many(["aishell_train"])["aishell_train"]
 
     def aishell_dev_cuts(self) -> CutSet:
         logging.info("About to get multidataset dev cuts")
-        logging.info("Loading Aishell set in lazy mode")
-        aishell_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_dev.jsonl.gz"
-        )
-
-        return aishell_dev_cuts
+        return self._load_many(["aishell_dev"])["aishell_dev"]
 
     def aishell_test_cuts(self) -> CutSet:
         logging.info("About to get multidataset test cuts")
-        logging.info("Loading Aishell set in lazy mode")
-        aishell_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell_cuts_test.jsonl.gz"
-        )
-
-        return {
-            "aishell_test": aishell_test_cuts,
-        }
+        return self._load_many(["aishell_test"])
 
     def aishell2_train_cuts(self) -> CutSet:
         logging.info("About to get multidataset train cuts")
-        logging.info("Loading Aishell-2 in lazy mode")
-        aishell_2_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_train.jsonl.gz"
-        )
-
-        return aishell_2_cuts
+        return self._load_many(["aishell-2_train"])["aishell-2_train"]
 
     def aishell2_dev_cuts(self) -> CutSet:
         logging.info("About to get multidataset dev cuts")
-        logging.info("Loading Aishell-2 set in lazy mode")
-        aishell2_dev_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_dev.jsonl.gz"
-        )
-
-        return aishell2_dev_cuts
+        return self._load_many(["aishell-2_dev"])["aishell-2_dev"]
 
     def aishell2_test_cuts(self) -> CutSet:
         logging.info("About to get multidataset test cuts")
-        logging.info("Loading Aishell-2 set in lazy mode")
-        aishell2_test_cuts = load_manifest_lazy(
-            self.fbank_dir / "aishell2_cuts_test.jsonl.gz"
-        )
-
         return {
-            "aishell2_test": aishell2_test_cuts,
+            "aishell2_test": self._load_many(["aishell-2_test"])["aishell-2_test"],
         }
 
     def wenetspeech_test_meeting_cuts(self) -> CutSet:
         logging.info("About to get multidataset test cuts")
-        logging.info("Loading WeNetSpeech set in lazy mode")
-        wenetspeech_test_meeting_cuts = load_manifest_lazy(
-            self.fbank_dir / "wenetspeech" / "cuts_TEST_MEETING.jsonl.gz"
-        )
-
-        return {
-            "wenetspeech-meeting_test": wenetspeech_test_meeting_cuts,
-        }
+        return self._load_many(["wenetspeech-meeting_test"])
 
     def speechio_test_cuts(self) -> Dict[str, CutSet]:
         logging.info("About to get multidataset test cuts")
-        start_index = 0
-        end_index = 26
-        dataset_parts = []
-        for i in range(start_index, end_index + 1):
-            idx = f"{i}".zfill(2)
-            dataset_parts.append(f"SPEECHIO_ASR_ZH000{idx}")
-
-        prefix = "speechio"
-        suffix = "jsonl.gz"
-
-        results_dict = {}
-        for partition in dataset_parts:
-            path = f"{prefix}_cuts_{partition}.{suffix}"
-
-            logging.info(f"Loading {path} set in lazy mode")
-            test_cuts = load_manifest_lazy(self.fbank_dir / path)
-            results_dict[partition] = test_cuts
-
-        return results_dict
+        return self._load_many(self._SPEECHIO_TEST_SETS)
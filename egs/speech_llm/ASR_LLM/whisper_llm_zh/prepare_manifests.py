@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+#
+# See ../../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This script prepares the files used by MultiDataset to speed up loading
+the manifests at training time. It only needs to be run once, after the
+manifests in --manifest-dir are created.
+
+Usage:
+
+./whisper_llm_zh/prepare_manifests.py \
+  --manifest-dir data/fbank \
+  --convert-to-zst true \
+  --prepare-weights true \
+  --export-shar true
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from multi_dataset import MultiDataset
+
+from icefall.utils import str2bool
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--manifest-dir",
+        type=Path,
+        default=Path("data/fbank"),
+        help="Path to directory with the manifests.",
+    )
+
+    parser.add_argument(
+        "--gzip-threads",
+        type=int,
+        default=1,
+        help="""Number of threads used to decompress each .jsonl.gz manifest.
+        Values larger than 1 require 'pip install rapidgzip'.""",
+    )
+
+    parser.add_argument(
+        "--convert-to-zst",
+        type=str2bool,
+        default=False,
+        help="""Write a .jsonl.zst copy of each .jsonl.gz manifest.
+        It requires 'pip install zstandard'.""",
+    )
+
+    parser.add_argument(
+        "--prepare-weights",
+        type=str2bool,
+        default=True,
+        help="""Count the cuts of each training set and save them to
+        train_mux_weights.json in --manifest-dir.""",
+    )
+
+    parser.add_argument(
+        "--export-shar",
+        type=str2bool,
+        default=False,
+        help="""Export the training sets with their features to the Lhotse
+        Shar format in the shar/ subdirectory of --manifest-dir. They are
+        used by MultiDataset(..., use_shar=True).""",
+    )
+
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=1000,
+        help="Number of cuts per shard when --export-shar is true.",
+    )
+
+    parser.add_argument(
+        "--num-jobs",
+        type=int,
+        default=16,
+        help="Number of parallel jobs when --export-shar is true.",
+    )
+
+    parser.add_argument(
+        "--build-merged-train",
+        type=str2bool,
+        default=False,
+        help="""Mix all training sets into a single manifest, which is used
+        by MultiDataset.train_cuts() instead of mixing them at runtime.""",
+    )
+
+    parser.add_argument(
+        "--quantize-dir",
+        type=Path,
+        default=None,
+        help="""If given, copy the manifests to this directory with their
+        features stored again with lilcom at the precision of --tick-power.""",
+    )
+
+    parser.add_argument(
+        "--tick-power",
+        type=int,
+        default=None,
+        help="""Required with --quantize-dir. Features are rounded to
+        multiples of 2^tick-power, i.e., changed by up to 2^(tick-power - 1).
+        For the Whisper features of this recipe, which span about 2 units of
+        40 dB each, -5 (the default of lhotse) changes them by up to 0.6 dB
+        and -3 by up to 2.5 dB.""",
+    )
+
+    return parser
+
+
+def main():
+    formatter = "%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] %(message)s"
+    logging.basicConfig(format=formatter, level=logging.INFO)
+
+    parser = get_parser()
+    args = parser.parse_args()
+    logging.info(vars(args))
+
+    multi_dataset = MultiDataset(args.manifest_dir, gzip_threads=args.gzip_threads)
+
+    # Convert first so that the weights are computed from the
+    # faster .jsonl.zst manifests.
+    if args.convert_to_zst:
+        multi_dataset.convert_manifests_to_zst()
+
+    if args.prepare_weights:
+        multi_dataset.prepare_weights()
+
+    if args.export_shar:
+        multi_dataset.export_shar(shard_size=args.shard_size, num_jobs=args.num_jobs)
+
+    if args.build_merged_train:
+        multi_dataset.build_merged_train()
+
+    if args.quantize_dir is not None:
+        assert args.tick_power is not None, "Please specify --tick-power"
+        multi_dataset.quantize_features(args.quantize_dir, tick_power=args.tick_power)
+
+
+if __name__ == "__main__":
+    main()
@@ -213,6 +213,24 @@ def get_parser():
         help="Whether to only use aishell1 dataset for training.",
     )
 
+    parser.add_argument(
+        "--prefetch-buffer-size",
+        type=int,
+        default=0,
+        help="""If positive and --use-aishell is false, the training cuts are
+        read ahead in a background process into a buffer of this size,
+        overlapping manifest decompression with training. 0 to disable.
+        """,
+    )
+
+    parser.add_argument(
+        "--gzip-threads",
+        type=int,
+        default=1,
+        help="""Number of threads used to decompress each .jsonl.gz manifest.
+        Values larger than 1 require 'pip install rapidgzip'.""",
+    )
+
     parser = deepspeed.add_config_arguments(parser)
     add_model_arguments(parser)
 
@@ -735,7 +753,7 @@ def run(rank, world_size, args):
     )
 
     data_module = AsrDataModule(args)
-    multi_dataset = MultiDataset(args.manifest_dir)
+    multi_dataset = MultiDataset(args.manifest_dir, gzip_threads=args.gzip_threads)
 
     def remove_short_and_long_utt(c: Cut):
         # Keep only utterances with duration between 1 second and 20 seconds
@@ -756,7 +774,9 @@ def run(rank, world_size, args):
     if params.use_aishell:
         train_cuts = multi_dataset.aishell_train_cuts()
     else:
-        train_cuts = multi_dataset.train_cuts()
+        train_cuts = multi_dataset.train_cuts(
+            prefetch_buffer_size=params.prefetch_buffer_size
+        )
 
     train_cuts = train_cuts.filter(remove_short_and_long_utt)
 